@@ -27,6 +27,8 @@ from multiprocessing import Pool, cpu_count
 import humanize
 import openpyxl
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
 import yfinance as yf
 from deprecated import deprecated
@@ -205,7 +207,9 @@ class DataProcessingInterface:
             if file_type == 'csv':
                 data.to_csv(output_path, index=False, encoding='utf-8-sig')
             elif file_type == 'parquet':
-                data.to_parquet(output_path, index=False)
+                # zstd + dictionary encoding compresses the highly repetitive k-line columns (e.g., code)
+                pq.write_table(pa.Table.from_pandas(data, preserve_index=False), output_path, compression='zstd',
+                               compression_level=3, use_dictionary=True, data_page_size=1 << 20)
             return True
         return False
 
@@ -258,7 +262,7 @@ class DataProcessingInterface:
             output_file.parent.mkdir(parents=True, exist_ok=True)
             DataProcessingInterface.default_logger.info(f'Converting {input_file} to {output_file}')
             df = pd.read_csv(input_file, index_col=None)
-            df.to_parquet(output_file, index=False)
+            DataProcessingInterface.save_stock_df_to_file(df, output_file)
             return True
         return False
 
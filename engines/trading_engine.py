@@ -20,10 +20,13 @@ import itertools
 import json
 import pathlib
 import platform
+import random
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, datetime, timedelta
 from multiprocessing import Pool, cpu_count
 
+import orjson
 import pandas as pd
 import psutil
 from futu import AccumulateFilter, AuType, Currency, KLType, KL_FIELD, Market, MarketState, OpenHKTradeContext, \
@@ -37,9 +40,17 @@ import engines
 from engines import DataProcessingInterface, HKEXInterface, YahooFinanceInterface
 from util import logger
 from util.global_vars import *
+from util.rate_limiter import RateLimiter
 
 
 class FutuTrade:
+    __slots__ = ('config', 'default_logger', 'quote_ctx', 'trade_ctx', 'username', 'password_md5', 'trd_env',
+                 'trading_util', 'market_list', 'security_type_list', 'reference_type_list', '_history_columns',
+                 'history_kline_limiter', 'basic_info_limiter', 'owner_plate_limiter')
+
+    _TRADING_STATES = frozenset({MarketState.MORNING, MarketState.AFTERNOON, MarketState.FUTURE_DAY_OPEN,
+                                 MarketState.FUTURE_OPEN, MarketState.NIGHT_OPEN})
+
     def __init__(self):
         """
             Futu Trading Engine Constructor
@@ -48,20 +59,22 @@ class FutuTrade:
         self.default_logger = logger.get_logger("futu_trade")
         self.__init_futu_client()
 
-        rsa_private_key = self.config['FutuOpenD.Config'].get('RsaPrivateKey')
+        # Read the connection section once and reuse it for both contexts
+        futu_config = dict(self.config.items('FutuOpenD.Config'))
+        host, port = futu_config['host'], int(futu_config['port'])
+
+        rsa_private_key = futu_config.get('rsaprivatekey')
         if rsa_private_key and pathlib.Path(rsa_private_key).is_file():
             # Setting protocol encryption globally
             SysConfig.enable_proto_encrypt(True)
             SysConfig.set_init_rsa_file(rsa_private_key)
 
-        self.quote_ctx = OpenQuoteContext(host=self.config['FutuOpenD.Config'].get('Host'),
-                                          port=self.config['FutuOpenD.Config'].getint('Port'))
-        self.trade_ctx = OpenHKTradeContext(host=self.config['FutuOpenD.Config'].get('Host'),
-                                            port=self.config['FutuOpenD.Config'].getint('Port'))
+        self.quote_ctx = OpenQuoteContext(host=host, port=port)
+        self.trade_ctx = OpenHKTradeContext(host=host, port=port)
         self.username = self.config['FutuOpenD.Credential'].get('Username')
         # self.password = self.config['FutuOpenD.Credential'].get('Password')
         self.password_md5 = self.config['FutuOpenD.Credential'].get('Password_md5')
-        self.trd_env = TrdEnv.REAL if self.config.get('FutuOpenD.Config', 'TrdEnv') == 'REAL' else TrdEnv.SIMULATE
+        self.trd_env = TrdEnv.REAL if futu_config['trdenv'] == 'REAL' else TrdEnv.SIMULATE
         self.trading_util = engines.OrderEngine(self.quote_ctx, self.trade_ctx, self.trd_env)
         # Futu-Specific Variables
         self.market_list = [Market.HK, Market.US, Market.SH, Market.SZ, Market.HK_FUTURE, Market.SG, Market.JP]
@@ -69,6 +82,13 @@ class FutuTrade:
                                    SecurityType.IDX, SecurityType.ETF, SecurityType.FUTURE, SecurityType.PLATE,
                                    SecurityType.PLATESET]
         self.reference_type_list = [SecurityReferenceType.WARRANT, SecurityReferenceType.FUTURE]
+        self._history_columns = tuple(json.loads(self.config.get('FutuOpenD.DataFormat', 'HistoryDataFormat')))
+        # Historical K-line requests are limited to max. 60 requests per 30 seconds
+        self.history_kline_limiter = RateLimiter(60, 30.0)
+        # Stock basic info requests are limited to max. 10 requests per 30 seconds
+        self.basic_info_limiter = RateLimiter(10, 30.0)
+        # Owner plate requests are limited to max. 10 requests per 30 seconds
+        self.owner_plate_limiter = RateLimiter(10, 30.0)
 
     def __del__(self):
         """
@@ -81,7 +101,8 @@ class FutuTrade:
 
     def __init_futu_client(self):
         os_type = platform.system()
-        if os_type == 'Windows' and 'FutuOpenD.exe' not in (p.name() for p in psutil.process_iter()):
+        if os_type == 'Windows' and not any(
+                p.info['name'] == 'FutuOpenD.exe' for p in psutil.process_iter(['name'])):
             opend_dir = Path.home() / 'AppData' / 'Roaming' / 'Futu' / 'FutuOpenD' / 'FutuOpenD.exe'
             try:
                 subprocess.Popen([opend_dir])
@@ -99,6 +120,14 @@ class FutuTrade:
             else:
                 raise Exception("Account Unlock Unsuccessful: {}".format(data))
 
+    @staticmethod
+    def __backoff(attempt: int):
+        """
+            Sleep before re-trying a failed request: exponential backoff capped at 8 seconds, plus jitter
+        :param attempt: Zero-based index of the failed attempt
+        """
+        time.sleep(min(8.0, 0.5 * 2 ** attempt) + random.random() * 0.1)
+
     def get_market_state(self):
         return self.quote_ctx.get_global_state()
 
@@ -116,25 +145,21 @@ class FutuTrade:
             self.default_logger.error('Get market state failed: ', data)
             return False
 
-        if all(market_state == MarketState.MORNING or \
-               market_state == MarketState.AFTERNOON or \
-               market_state == MarketState.FUTURE_DAY_OPEN or \
-               market_state == MarketState.FUTURE_OPEN or \
-               market_state == MarketState.NIGHT_OPEN for market_state in data['market_state'].values.tolist()):
+        if data['market_state'].isin(self._TRADING_STATES).all():
             return True
         self.default_logger.error('It is not regular trading hours.')
         return False
 
     def get_reference_stock_list(self, stock_code: str) -> pd.DataFrame:
-        output_df = pd.DataFrame()
-        for security_reference_type in self.security_type_list:
+        frames = []
+        for security_reference_type in self.reference_type_list:
             ret, data = self.quote_ctx.get_referencestock_list(stock_code, security_reference_type)
             if ret == RET_OK:
                 self.default_logger.info(f"Received Reference Stock List for {stock_code}")
-                output_df = pd.concat([output_df, data], ignore_index=True)
+                frames.append(data)
             else:
                 self.default_logger.error(f"Cannot Retrieve Reference Stock List for {stock_code}")
-        return output_df
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
 
     def get_filtered_turnover_stocks(self) -> list:
         """
@@ -216,12 +241,16 @@ class FutuTrade:
         :return: dictionary of k-line data
         """
         input_data = {}
-        for stock_code in stock_list:
-            ret, data = self.quote_ctx.get_cur_kline(stock_code, kline_num, sub_type, AuType.QFQ)
-            if ret == RET_OK:
-                input_data[stock_code] = input_data.get(stock_code, data)
-            else:
-                self.default_logger.error(f'Cannot get Real-time K-line data: {data}')
+        with ThreadPoolExecutor(max_workers=max(1, min(16, len(stock_list)))) as executor:
+            futures = {executor.submit(self.quote_ctx.get_cur_kline, stock_code, kline_num, sub_type, AuType.QFQ):
+                           stock_code for stock_code in stock_list}
+            for future in as_completed(futures):
+                stock_code = futures[future]
+                ret, data = future.result()
+                if ret == RET_OK:
+                    input_data[stock_code] = data
+                else:
+                    self.default_logger.error(f'Cannot get Real-time K-line data: {data}')
         return input_data
 
     def update_1M_data(self, stock_code: str, years=2, force_update: bool = False, default_days: int = 30):
@@ -233,55 +262,53 @@ class FutuTrade:
         :param default_days:
         :param force_update:
         """
-        column_names = json.loads(self.config.get('FutuOpenD.DataFormat', 'HistoryDataFormat'))
-        history_df = pd.DataFrame(columns=column_names)
+        history_frames = []
         # If force update, update all 2-years 1M data. Otherwise only update the last week's data
-        start_date = str((datetime.today() - timedelta(days=round(365 * years))).date()) if force_update else str(
-            (datetime.today() - timedelta(days=default_days)).date())
-        end_date = str(datetime.today().date())
-        # This will give a list of dates between 2-years range
-        date_range = pd.date_range(start_date, end_date, freq='d').strftime(DATETIME_FORMAT_DW).tolist()
-        # Retrieve the first page
-        ret, data, page_req_key = self.quote_ctx.request_history_kline(stock_code,
-                                                                       start=start_date,
-                                                                       end=end_date,
-                                                                       ktype=KLType.K_1M, autype=AuType.QFQ,
-                                                                       fields=[KL_FIELD.ALL],
-                                                                       max_count=1000, page_req_key=None,
-                                                                       extended_time=False)
-        if ret == RET_OK:
-            history_df = pd.concat([history_df, data], ignore_index=True)
-        else:
-            self.default_logger.error(f'Cannot get Historical 1M K-line data: {data}')
-            return
-
-        # 请求后面的所有结果
-        while page_req_key is not None:
-            # The inner loop is to ensure that whenever there is an error, we can re-try until it success
-            while True:
-                original_page_req_key = page_req_key
-                ret, data, page_req_key = self.quote_ctx.request_history_kline(stock_code,
-                                                                               start=start_date,
-                                                                               end=end_date,
-                                                                               ktype=KLType.K_1M, autype=AuType.QFQ,
-                                                                               fields=[KL_FIELD.ALL],
-                                                                               max_count=1000,
-                                                                               page_req_key=page_req_key,
-                                                                               extended_time=False)
+        today = datetime.today().date()
+        start_date = str(today - timedelta(days=round(365 * years) if force_update else default_days))
+        end_date = str(today)
+        # Retrieve the first page and then all following pages (请求后面的所有结果)
+        page_req_key = None
+        while True:
+            # The inner loop re-tries the same page with exponential backoff whenever there is an error
+            for attempt in range(HISTORY_RETRY_MAX):
+                self.history_kline_limiter.acquire()
+                ret, data, next_page_req_key = self.quote_ctx.request_history_kline(stock_code,
+                                                                                    start=start_date,
+                                                                                    end=end_date,
+                                                                                    ktype=KLType.K_1M,
+                                                                                    autype=AuType.QFQ,
+                                                                                    fields=[KL_FIELD.ALL],
+                                                                                    max_count=1000,
+                                                                                    page_req_key=page_req_key,
+                                                                                    extended_time=False)
                 if ret == RET_OK:
-                    history_df = pd.concat([history_df, data], ignore_index=True)
+                    history_frames.append(data)
                     break
                 self.default_logger.error(f'Cannot get Historical 1M K-line data: {data}')
-                # Revert to previous page req key and re-try again
-                page_req_key = original_page_req_key
-                time.sleep(1)
-
-        for input_date in date_range:
-            output_path = PATH_DATA / stock_code / f'{stock_code}_{input_date}_1M.parquet'
-            output_df = history_df[history_df['time_key'].str.contains(input_date)]
-            if DataProcessingInterface.save_stock_df_to_file(output_df, output_path):
+                if attempt < HISTORY_RETRY_MAX - 1:
+                    self.__backoff(attempt)
+            else:
+                raise RuntimeError(f'Cannot get Historical 1M K-line data for {stock_code} after '
+                                   f'{HISTORY_RETRY_MAX} retries')
+            page_req_key = next_page_req_key
+            if page_req_key is None:
+                break
+
+        history_df = pd.concat(history_frames, ignore_index=True)
+        # Configured history columns come first (and always exist) in the saved files
+        history_df = history_df.reindex(columns=[*self._history_columns, *history_df.columns.difference(
+            self._history_columns, sort=False)])
+        # Keep one file per trading day: DataProcessingInterface, the backtesting engine and the tests all address
+        # 1M data as {stock_code}_{YYYY-MM-DD}_1M.parquet, so a partitioned dataset layout would break every reader.
+        # Parse time_key once and group by the (int64-backed) trading day instead of hashing date strings
+        time_keys = pd.to_datetime(history_df['time_key'], format='%Y-%m-%d %H:%M:%S', cache=True)
+        history_df['_date'] = time_keys.dt.normalize()
+        # Save inline: paging is complete by now, and update_all_1M already overlaps these writes with other stocks
+        for input_date, output_df in history_df.groupby('_date', sort=False):
+            output_path = PATH_DATA / stock_code / f'{stock_code}_{input_date.strftime(DATETIME_FORMAT_DW)}_1M.parquet'
+            if DataProcessingInterface.save_stock_df_to_file(output_df.drop(columns='_date'), output_path):
                 self.default_logger.info(f'Saved 1M K-line data to {output_path}')
-        time.sleep(0.5)
 
     def update_DW_data(self, stock_code: str, years=10, force_update: bool = False, k_type: KLType = KLType.K_DAY):
         """
@@ -291,37 +318,92 @@ class FutuTrade:
         :param years: 10 years
         :param k_type: Futu K-Line Type
         """
-        for i in range(0, 11 if force_update else (years + 1)):
-            start_date = date((datetime.today() - timedelta(days=i * 365)).year, 1, 1)
+        if k_type == KLType.K_DAY:
+            file_suffix = '1D'
+        elif k_type == KLType.K_WEEK:
+            file_suffix = '1W'
+        else:
+            self.default_logger.error('Unsupported KLType. Please try it later.')
+            return False
 
-            DataProcessingInterface.validate_dir(PATH_DATA / stock_code)
+        DataProcessingInterface.validate_dir(PATH_DATA / stock_code)
 
-            if k_type == KLType.K_DAY:
-                output_path = PATH_DATA / stock_code / f'{stock_code}_{start_date.year}_1D.parquet'
-            elif k_type == KLType.K_WEEK:
-                output_path = PATH_DATA / stock_code / f'{stock_code}_{start_date.year}_1W.parquet'
-            else:
-                self.default_logger.error('Unsupported KLType. Please try it later.')
-                return False
-
-            # Request Historical K-line Data (Daily)
-            start_date = start_date.strftime(DATETIME_FORMAT_DW)
-            while True:
-                ret, data, page_req_key = self.quote_ctx.request_history_kline(stock_code, start=start_date,
-                                                                               end=None,
-                                                                               ktype=k_type, autype=AuType.QFQ,
-                                                                               fields=[KL_FIELD.ALL],
-                                                                               max_count=1000, page_req_key=None,
-                                                                               extended_time=False)
+        # Request the whole range at once (paginated) and split it into one file per year afterwards
+        base_year = datetime.today().year
+        start_date = date(base_year - (10 if force_update else years), 1, 1).strftime(DATETIME_FORMAT_DW)
+        history_frames = []
+        page_req_key = None
+        while True:
+            for attempt in range(HISTORY_RETRY_MAX):
+                self.history_kline_limiter.acquire()
+                ret, data, next_page_req_key = self.quote_ctx.request_history_kline(stock_code, start=start_date,
+                                                                                    end=None,
+                                                                                    ktype=k_type, autype=AuType.QFQ,
+                                                                                    fields=[KL_FIELD.ALL],
+                                                                                    max_count=1000,
+                                                                                    page_req_key=page_req_key,
+                                                                                    extended_time=False)
                 if ret == RET_OK:
-                    if DataProcessingInterface.save_stock_df_to_file(data, output_path):
-                        self.default_logger.info(f'Saved {k_type} K-line data to {output_path}')
-                    # Probably empty data during a non-trading date
+                    history_frames.append(data)
                     break
                 # Retry Storing Data due to too frequent requests (max. 60 requests per 30 seconds)
-                time.sleep(1)
                 self.default_logger.error(f'{k_type} Historical KLine Store Error: {data}')
-            time.sleep(0.6)
+                if attempt < HISTORY_RETRY_MAX - 1:
+                    self.__backoff(attempt)
+            else:
+                raise RuntimeError(f'Cannot get Historical {k_type} K-line data for {stock_code} after '
+                                   f'{HISTORY_RETRY_MAX} retries')
+            page_req_key = next_page_req_key
+            if page_req_key is None:
+                break
+
+        history_df = pd.concat(history_frames, ignore_index=True)
+        # time_key is in format YYYY-MM-DD HH:MM:SS, so the first 4 characters identify the year
+        for year, output_df in history_df.groupby(history_df['time_key'].str.slice(0, 4), sort=False):
+            output_path = PATH_DATA / stock_code / f'{stock_code}_{year}_{file_suffix}.parquet'
+            if DataProcessingInterface.save_stock_df_to_file(output_df, output_path):
+                self.default_logger.info(f'Saved {k_type} K-line data to {output_path}')
+
+    def update_all_1M(self, stock_list: list, force_update: bool = False, default_days: int = 30,
+                      max_workers: int = 8):
+        """
+            Update 1M Data for a list of stocks concurrently. Requests are throttled by the shared rate limiter.
+        :param stock_list: A List of Stock Code with Format (e.g., [HK.00001, HK.00002])
+        :param force_update: If True, update all 2-years 1M data
+        :param default_days: Number of days to update if not force update
+        :param max_workers: Number of concurrent download threads
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.update_1M_data, stock_code, force_update=force_update,
+                                       default_days=default_days): stock_code for stock_code in stock_list}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.default_logger.error(f'Cannot update 1M K-line data for {futures[future]}: {e}')
+
+    def update_all_DW(self, stock_list: list, years=10, force_update: bool = False, k_type: KLType = KLType.K_DAY,
+                      max_workers: int = 8):
+        """
+            Update 1D/1W Data for a list of stocks concurrently. Requests are throttled by the shared rate limiter.
+        :param stock_list: A List of Stock Code with Format (e.g., [HK.00001, HK.00002])
+        :param years: 10 years
+        :param force_update: If True, update all 10-years data
+        :param k_type: Futu K-Line Type
+        :param max_workers: Number of concurrent download threads
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.update_DW_data, stock_code, years=years, force_update=force_update,
+                                       k_type=k_type): stock_code for stock_code in stock_list}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.default_logger.error(f'Cannot update {k_type} K-line data for {futures[future]}: {e}')
+
+    def __get_owner_plate(self, stock_list: list):
+        self.owner_plate_limiter.acquire()
+        return self.quote_ctx.get_owner_plate(stock_list)
 
     def update_owner_plate(self, stock_list: list):
         """
@@ -330,29 +412,38 @@ class FutuTrade:
         """
         # Slice the list into 200-elements per list
         stock_lists = [stock_list[i:i + 200] for i in range(0, len(stock_list), 200)]
-        output_df = pd.DataFrame()
-        for stock_list in stock_lists:
-            ret, data = self.quote_ctx.get_owner_plate(stock_list)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(self.__get_owner_plate, stock_lists))
+        frames = []
+        for ret, data in results:
             if ret == RET_OK:
-                output_df = pd.concat([output_df, data], ignore_index=True)
+                frames.append(data)
             else:
                 self.default_logger.error(f'Cannot get Owner Plate: {data}')
-            time.sleep(3.5)
+        output_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
         output_path = PATH_DATA / 'Stock_Pool' / 'stock_owner_plate.parquet'
         DataProcessingInterface.save_stock_df_to_file(output_df, output_path)
         self.default_logger.info(f'Stock Owner Plate Updated: {output_path}')
 
+    def __get_stock_basicinfo(self, market: Market, stock_type: SecurityType):
+        self.basic_info_limiter.acquire()
+        return self.quote_ctx.get_stock_basicinfo(market=market, stock_type=stock_type)
+
     def update_stock_basicinfo(self):
         """
         Update stock static information for all markets and all forms of equities (E.g., Stock, Futures, etc.)
         """
-        output_df = pd.DataFrame()
-        for market, stock_type in itertools.product(self.market_list, self.security_type_list):
-            ret, data = self.quote_ctx.get_stock_basicinfo(market=market, stock_type=stock_type)
+        markets, stock_types = zip(*itertools.product(self.market_list, self.security_type_list))
+        # Throughput is bound by the basic info quota, so no more workers than the limiter admits per window
+        with ThreadPoolExecutor(max_workers=self.basic_info_limiter.max_calls) as executor:
+            results = list(executor.map(self.__get_stock_basicinfo, markets, stock_types))
+        frames = []
+        for market, stock_type, (ret, data) in zip(markets, stock_types, results):
             if ret == RET_OK:
-                output_df = pd.concat([output_df, data], ignore_index=True)
+                frames.append(data)
             else:
                 self.default_logger.error(f'Cannot get Stock Basic Info of {market} - {stock_type}: {data}')
+        output_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
         output_path = PATH_DATA / 'Stock_Pool' / 'stock_basic_info.parquet'
         DataProcessingInterface.save_stock_df_to_file(output_df, output_path)
         self.default_logger.info(f'Stock Static Basic Info Updated: {output_path}')
@@ -361,18 +452,15 @@ class FutuTrade:
         """
         Update stock fundamentals information for all equities in Hong Kong stock market.
         """
-        pool = Pool(cpu_count())
-        output_list = pool.map(YahooFinanceInterface.parse_stock_info, HKEXInterface.get_equity_list_full())
-        pool.close()
-        pool.join()
-
         output_dict = {}
-        for record in output_list:
-            output_dict[record[0]] = output_dict.get(record[0], record[1])
-            self.default_logger.info(f"Updated Stock Fundamentals for {record[0]}")
-
-        with open(PATH_DATA / 'Stock_Pool' / 'stock_fundamentals.json', 'w') as f:
-            json.dump(output_dict, f)
+        with Pool(cpu_count()) as pool:
+            # Consume results as soon as they arrive instead of materializing the full list first
+            for record in pool.imap_unordered(YahooFinanceInterface.parse_stock_info,
+                                              HKEXInterface.get_equity_list_full(), chunksize=16):
+                output_dict[record[0]] = record[1]
+                self.default_logger.info(f"Updated Stock Fundamentals for {record[0]}")
+
+        (PATH_DATA / 'Stock_Pool' / 'stock_fundamentals.json').write_bytes(orjson.dumps(output_dict))
 
     def cur_kline_evaluate(self, stock_list: list, strategy_map: dict, sub_type: SubType = SubType.K_1M):
         """
@@ -59,12 +59,11 @@ def daily_update_data(futu_trade, stock_list: list, force_update: bool = False):
     default_days = max([DataProcessingInterface.get_num_days_to_update(stock_code) for stock_code in stock_list])
 
     # Update historical k-line
-    for stock_code in stock_list:
-        futu_trade.update_DW_data(stock_code, years=ceil(default_days / 365), force_update=force_update,
-                                  k_type=KLType.K_DAY)
-        futu_trade.update_DW_data(stock_code, years=ceil(default_days / 365), force_update=force_update,
-                                  k_type=KLType.K_WEEK)
-        futu_trade.update_1M_data(stock_code, force_update=force_update, default_days=default_days)
+    futu_trade.update_all_DW(stock_list, years=ceil(default_days / 365), force_update=force_update,
+                             k_type=KLType.K_DAY)
+    futu_trade.update_all_DW(stock_list, years=ceil(default_days / 365), force_update=force_update,
+                             k_type=KLType.K_WEEK)
+    futu_trade.update_all_1M(stock_list, force_update=force_update, default_days=default_days)
 
     # Clean non-trading days data (Obsoleted)
     # DataProcessingInterface.clear_empty_data()
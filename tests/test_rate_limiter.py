@@ -0,0 +1,66 @@
+#  Futu Algo: Algorithmic Trading Framework
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  Written by Bill Chan <billpwchan@hotmail.com>, 2022
+#  Copyright (c)  billpwchan - All Rights Reserved
+
+import threading
+import time
+import unittest
+
+from util.rate_limiter import RateLimiter
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_acquire_within_quota(self):
+        rate_limiter = RateLimiter(max_calls=3, period=60.0)
+        start_time = time.monotonic()
+        for _ in range(3):
+            rate_limiter.acquire()
+        # A blocked call would have to wait for the full 60-second window
+        self.assertLess(time.monotonic() - start_time, 30.0)
+
+    def test_acquire_blocks_until_oldest_call_expires(self):
+        period = 0.5
+        rate_limiter = RateLimiter(max_calls=2, period=period)
+        first_grant = rate_limiter.acquire()
+        time.sleep(0.1)
+        rate_limiter.acquire()
+
+        # The third call may only proceed once the first call has left the window
+        third_grant = rate_limiter.acquire()
+        self.assertGreaterEqual(third_grant - first_grant, period)
+
+    def test_acquire_thread_safe(self):
+        period = 0.3
+        rate_limiter = RateLimiter(max_calls=2, period=period)
+        grant_times = []
+        lock = threading.Lock()
+
+        def worker():
+            grant_time = rate_limiter.acquire()
+            with lock:
+                grant_times.append(grant_time)
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        grant_times.sort()
+        self.assertEqual(len(grant_times), 5)
+        # Any 3 consecutive grants must span at least one full period
+        for i in range(len(grant_times) - 2):
+            self.assertGreaterEqual(grant_times[i + 2] - grant_times[i], period)
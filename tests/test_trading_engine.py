@@ -0,0 +1,140 @@
+#  Futu Algo: Algorithmic Trading Framework
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  Written by Bill Chan <billpwchan@hotmail.com>, 2022
+#  Copyright (c)  billpwchan - All Rights Reserved
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+from futu import KLType, RET_ERROR, RET_OK
+
+from engines import DataProcessingInterface, FutuTrade
+from util.global_vars import HISTORY_RETRY_MAX
+from util.rate_limiter import RateLimiter
+
+
+def _kline_page(time_keys: list) -> pd.DataFrame:
+    return pd.DataFrame({'time_key': time_keys, 'close': [1.0] * len(time_keys), 'code': 'HK.09988',
+                         'open': [1.0] * len(time_keys)})
+
+
+class TestFutuTradeHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        for patcher in (patch('engines.trading_engine.PATH_DATA', Path(self.tmp_dir.name)),
+                        patch.object(FutuTrade, '_FutuTrade__backoff')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        save_patcher = patch.object(DataProcessingInterface, 'save_stock_df_to_file', return_value=True)
+        self.save_stock_df_to_file = save_patcher.start()
+        self.addCleanup(save_patcher.stop)
+
+        # Bypass __init__ so that no FutuOpenD connection is needed
+        self.futu_trade = FutuTrade.__new__(FutuTrade)
+        self.futu_trade.default_logger = MagicMock()
+        self.futu_trade.quote_ctx = MagicMock()
+        self.futu_trade.trade_ctx = MagicMock()
+        self.futu_trade.history_kline_limiter = RateLimiter(1000, 1.0)
+        self.futu_trade._history_columns = ('code', 'time_key', 'open', 'close')
+
+    def saved_files(self) -> dict:
+        return {Path(call.args[1]).name: call.args[0] for call in self.save_stock_df_to_file.call_args_list}
+
+    def test_update_DW_data_collects_all_pages(self):
+        self.futu_trade.quote_ctx.request_history_kline.side_effect = [
+            (RET_OK, _kline_page(['2021-12-30 00:00:00', '2021-12-31 00:00:00']), 'page_2'),
+            (RET_OK, _kline_page(['2022-01-03 00:00:00']), None),
+        ]
+        self.futu_trade.update_DW_data('HK.09988', years=1, k_type=KLType.K_DAY)
+
+        page_req_keys = [call.kwargs['page_req_key'] for call in
+                         self.futu_trade.quote_ctx.request_history_kline.call_args_list]
+        self.assertEqual(page_req_keys, [None, 'page_2'])
+
+    def test_update_DW_data_one_file_per_year(self):
+        self.futu_trade.quote_ctx.request_history_kline.side_effect = [
+            (RET_OK, _kline_page(['2021-12-30 00:00:00', '2021-12-31 00:00:00']), 'page_2'),
+            (RET_OK, _kline_page(['2022-01-03 00:00:00']), None),
+        ]
+        self.futu_trade.update_DW_data('HK.09988', years=1, k_type=KLType.K_WEEK)
+
+        saved_files = self.saved_files()
+        self.assertCountEqual(saved_files.keys(), ['HK.09988_2021_1W.parquet', 'HK.09988_2022_1W.parquet'])
+        self.assertEqual(saved_files['HK.09988_2021_1W.parquet']['time_key'].tolist(),
+                         ['2021-12-30 00:00:00', '2021-12-31 00:00:00'])
+        self.assertEqual(saved_files['HK.09988_2022_1W.parquet']['time_key'].tolist(), ['2022-01-03 00:00:00'])
+
+    def test_update_1M_data_retries_same_page(self):
+        self.futu_trade.quote_ctx.request_history_kline.side_effect = [
+            (RET_OK, _kline_page(['2022-04-11 09:31:00']), 'page_2'),
+            (RET_ERROR, 'too frequent', None),
+            (RET_OK, _kline_page(['2022-04-12 09:31:00']), None),
+        ]
+        self.futu_trade.update_1M_data('HK.09988')
+
+        page_req_keys = [call.kwargs['page_req_key'] for call in
+                         self.futu_trade.quote_ctx.request_history_kline.call_args_list]
+        self.assertEqual(page_req_keys, [None, 'page_2', 'page_2'])
+        self.assertEqual(len(self.saved_files()), 2)
+
+    def test_update_1M_data_raises_after_max_retries(self):
+        self.futu_trade.quote_ctx.request_history_kline.side_effect = \
+            [(RET_ERROR, 'too frequent', None)] * HISTORY_RETRY_MAX
+        with self.assertRaises(RuntimeError):
+            self.futu_trade.update_1M_data('HK.09988')
+
+        self.assertEqual(self.futu_trade.quote_ctx.request_history_kline.call_count, HISTORY_RETRY_MAX)
+        # No backoff after the last failed attempt
+        self.assertEqual(FutuTrade._FutuTrade__backoff.call_count, HISTORY_RETRY_MAX - 1)
+        self.save_stock_df_to_file.assert_not_called()
+
+    def test_update_DW_data_raises_after_max_retries(self):
+        self.futu_trade.quote_ctx.request_history_kline.side_effect = [
+            (RET_OK, _kline_page(['2021-12-30 00:00:00']), 'page_2'),
+            *[(RET_ERROR, 'too frequent', None)] * HISTORY_RETRY_MAX,
+        ]
+        with self.assertRaises(RuntimeError):
+            self.futu_trade.update_DW_data('HK.09988', years=1, k_type=KLType.K_DAY)
+
+        page_req_keys = [call.kwargs['page_req_key'] for call in
+                         self.futu_trade.quote_ctx.request_history_kline.call_args_list]
+        self.assertEqual(page_req_keys, [None, *['page_2'] * HISTORY_RETRY_MAX])
+        self.save_stock_df_to_file.assert_not_called()
+
+    def test_update_1M_data_one_file_per_trading_day(self):
+        self.futu_trade.quote_ctx.request_history_kline.side_effect = [
+            (RET_OK, _kline_page(['2022-04-11 09:31:00', '2022-04-11 16:00:00', '2022-04-12 09:31:00']), None),
+        ]
+        self.futu_trade.update_1M_data('HK.09988')
+
+        saved_files = self.saved_files()
+        self.assertCountEqual(saved_files.keys(), ['HK.09988_2022-04-11_1M.parquet', 'HK.09988_2022-04-12_1M.parquet'])
+        self.assertEqual(saved_files['HK.09988_2022-04-11_1M.parquet']['time_key'].tolist(),
+                         ['2022-04-11 09:31:00', '2022-04-11 16:00:00'])
+        for output_df in saved_files.values():
+            self.assertNotIn('_date', output_df.columns)
+
+    def test_update_1M_data_history_columns_first(self):
+        page = _kline_page(['2022-04-11 09:31:00'])
+        page['name'] = 'BABA-SW'
+        self.futu_trade.quote_ctx.request_history_kline.side_effect = [(RET_OK, page, None)]
+        self.futu_trade.update_1M_data('HK.09988')
+
+        output_df = self.saved_files()['HK.09988_2022-04-11_1M.parquet']
+        self.assertEqual(output_df.columns.tolist(), ['code', 'time_key', 'open', 'close', 'name'])
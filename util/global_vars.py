@@ -36,6 +36,7 @@ DATETIME_FORMAT_DW = '%Y-%m-%d'
 DATETIME_FORMAT_M = ''
 
 ORDER_RETRY_MAX = 3
+HISTORY_RETRY_MAX = 6
 
 if not (PATH_CONFIG / 'config.ini').is_file():
     if not (PATH_CONFIG / 'config_template.ini').is_file():
@@ -0,0 +1,50 @@
+#  Futu Algo: Algorithmic High-Frequency Trading Framework
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  Written by Bill Chan <billpwchan@hotmail.com>, 2021
+#  Copyright (c)  billpwchan - All Rights Reserved
+
+
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    def __init__(self, max_calls: int, period: float):
+        """
+            Thread-safe sliding-window rate limiter (e.g., Futu historical k-line: max. 60 requests per 30 seconds)
+        :param max_calls: Maximum number of calls allowed within one period
+        :param period: Length of the window in seconds
+        """
+        self.max_calls = max_calls
+        self.period = period
+        self.__calls = deque()
+        self.__lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+            Block until a call slot is available within the current window
+        :return: time.monotonic() timestamp at which the slot was granted
+        """
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                while self.__calls and now - self.__calls[0] >= self.period:
+                    self.__calls.popleft()
+                if len(self.__calls) < self.max_calls:
+                    self.__calls.append(now)
+                    return now
+                wait_time = self.period - (now - self.__calls[0])
+            time.sleep(wait_time)